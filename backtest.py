@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+# backtest.py
+
+import multiprocessing
+import traceback
+import Queue
+from collections import deque
+
+from ringbuffer import RingBuffer
+
+
+class Backtest(object):
+    """
+    Инкапсулирует настройки и компоненты для проведения событийно-ориентированного бэктеста.
+
+    В обычном режиме все компоненты работают в одном процессе с общей очередью событий. В конвейерном режиме (pipelined=True) декодирование баров, вычисление сигналов и учет портфолио с исполнением приказов работают в отдельных процессах, связанных кольцевыми буферами в разделяемой памяти. Этап портфолио воспроизводит очередь событий обычного режима: каждое событие MARKET, полученное от DataHandler, отдельно обрабатывается стратегией и update_timeindex, а все события стратегии попадают в очередь в том же порядке. Поэтому результаты совпадают с обычным режимом при условии, что стратегия не обращается к портфолио и обработчику исполнения (в конвейерном режиме они находятся в другом процессе).
+
+Этап данных определяет новые бары по временной метке (второй элемент бара) и числу уже отправленных баров с той же меткой. Если временная метка тикера идет назад, бэктест завершается с ошибкой. Каждый тикер и каждое событие передаются отдельным сообщением, поэтому размер слота буфера ограничивает только бары одного тикера за один вызов update_bars() и отдельные события.
+    """
+
+    def __init__(self, csv_dir, symbol_list, initial_capital, start_date,
+                 data_handler, execution_handler, portfolio, strategy,
+                 pipelined=False, buffer_slots=256, buffer_slot_size=16384):
+        """
+        Инициализирует бэктест.
+
+        Параметры:
+        csv_dir - Путь к каталогу с CSV-файлами данных.
+        symbol_list - Список тикеров.
+        initial_capital - Начальный капитал портфолио.
+        start_date - Дата и время начала работы стратегии.
+        data_handler - (Класс) Обработчик рыночных данных.
+        execution_handler - (Класс) Обработчик приказов и сделок.
+        portfolio - (Класс) Портфолио, отслеживающее позиции и стоимость.
+        strategy - (Класс) Стратегия, генерирующая сигналы на основе данных.
+        pipelined - Запускать ли этапы бэктеста в отдельных процессах.
+        buffer_slots - Количество слотов в каждом кольцевом буфере конвейера.
+        buffer_slot_size - Размер слота кольцевого буфера в байтах.
+        """
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.initial_capital = initial_capital
+        self.start_date = start_date
+
+        self.data_handler_cls = data_handler
+        self.execution_handler_cls = execution_handler
+        self.portfolio_cls = portfolio
+        self.strategy_cls = strategy
+
+        self.pipelined = pipelined
+        self.buffer_slots = buffer_slots
+        self.buffer_slot_size = buffer_slot_size
+
+        self.events = Queue.Queue()
+
+        self.signals = 0
+        self.orders = 0
+        self.fills = 0
+
+    def run(self):
+        """
+        Выполняет бэктест в выбранном режиме. По завершении self.portfolio содержит итоговые позиции и стоимость.
+        """
+        if self.pipelined:
+            self._run_pipelined()
+        else:
+            self._run_serial()
+
+    def _dispatch(self, event):
+        """
+        Передает событие SIGNAL, ORDER или FILL соответствующему компоненту.
+
+        Параметры:
+        event - Объект Event из очереди событий.
+        """
+        if event.type == 'SIGNAL':
+            self.signals += 1
+            self.portfolio.update_signal(event)
+        elif event.type == 'ORDER':
+            self.orders += 1
+            self.execution_handler.execute_order(event)
+        elif event.type == 'FILL':
+            self.fills += 1
+            self.portfolio.update_fill(event)
+
+    def _drain_events(self, strategy_events):
+        """
+        Обрабатывает очередь событий до тех пор, пока она не опустеет. Для каждого события MARKET в очередь добавляются события, которые стратегия сгенерировала в другом процессе, как это сделал бы calculate_signals() в обычном режиме.
+
+        Параметры:
+        strategy_events - Очередь (deque) списков событий стратегии, по одному списку на каждое событие MARKET.
+        """
+        while True:
+            try:
+                event = self.events.get(False)
+            except Queue.Empty:
+                break
+            if event is None:
+                continue
+            if event.type == 'MARKET':
+                for strategy_event in strategy_events.popleft():
+                    self.events.put(strategy_event)
+                self.portfolio.update_timeindex(event)
+            else:
+                self._dispatch(event)
+
+    def _run_serial(self):
+        """
+        Выполняет бэктест в одном процессе: бары, сигналы, приказы и сделки обрабатываются по очереди.
+        """
+        self.data_handler = self.data_handler_cls(self.events, self.csv_dir,
+                                                  self.symbol_list)
+        self.strategy = self.strategy_cls(self.data_handler, self.events)
+        self.portfolio = self.portfolio_cls(self.data_handler, self.events,
+                                            self.start_date,
+                                            self.initial_capital)
+        self.execution_handler = self.execution_handler_cls(self.events)
+
+        while self.data_handler.continue_backtest:
+            self.data_handler.update_bars()
+
+            while True:
+                try:
+                    event = self.events.get(False)
+                except Queue.Empty:
+                    break
+                if event is None:
+                    continue
+                if event.type == 'MARKET':
+                    self.strategy.calculate_signals(event)
+                    self.portfolio.update_timeindex(event)
+                else:
+                    self._dispatch(event)
+
+    def _run_pipelined(self):
+        """
+        Выполняет бэктест конвейером из трех процессов: данные -> стратегия -> портфолио и исполнение.
+
+        Портфолио и обработчик исполнения работают в текущем процессе, поэтому после завершения self.portfolio доступен как и в обычном режиме. Стратегия работает в отдельном процессе, поэтому self.strategy равен None.
+        """
+        bar_buffer = RingBuffer(self.buffer_slots, self.buffer_slot_size)
+        signal_buffer = RingBuffer(self.buffer_slots, self.buffer_slot_size)
+
+        self.data_handler = BarMirror(self.symbol_list)
+        self.strategy = None
+        self.portfolio = self.portfolio_cls(self.data_handler, self.events,
+                                            self.start_date,
+                                            self.initial_capital)
+        self.execution_handler = self.execution_handler_cls(self.events)
+
+        stages = [
+            multiprocessing.Process(
+                target=_data_stage,
+                args=(bar_buffer, self.data_handler_cls, self.csv_dir,
+                      self.symbol_list)),
+            multiprocessing.Process(
+                target=_strategy_stage,
+                args=(bar_buffer, signal_buffer, self.strategy_cls,
+                      self.symbol_list)),
+        ]
+        for stage in stages:
+            stage.daemon = True
+            stage.start()
+
+        try:
+            strategy_events = deque()
+            while True:
+                kind, payload = self._receive(signal_buffer, stages)
+                if kind == 'DONE':
+                    break
+                if kind == 'ERROR':
+                    raise RuntimeError("Pipeline stage failed:\n%s" % payload)
+
+                if kind == 'BARS':
+                    symbol, bars = payload
+                    self.data_handler.append_bars(symbol, bars)
+                elif kind == 'MARKET':
+                    self.events.put(payload)
+                    strategy_events.append([])
+                elif kind == 'STRATEGY':
+                    strategy_events[-1].append(payload)
+                elif kind == 'EVENT':
+                    self.events.put(payload)
+                elif kind == 'END':
+                    # Все бары и события одного вызова update_bars() получены,
+                    # очередь обрабатывается так же, как в обычном режиме.
+                    self._drain_events(strategy_events)
+        finally:
+            for stage in stages:
+                if stage.is_alive():
+                    stage.terminate()
+                stage.join()
+
+    def _receive(self, buffer, stages, poll_interval=0.5):
+        """
+        Читает следующее сообщение конвейера, периодически проверяя, что процессы этапов не завершились с ошибкой.
+
+        Параметры:
+        buffer - Кольцевой буфер RingBuffer для чтения.
+        stages - Список процессов этапов конвейера.
+        poll_interval - Интервал проверки процессов в секундах.
+        """
+        while True:
+            try:
+                return buffer.get(timeout=poll_interval)
+            except Queue.Empty:
+                pass
+            for stage in stages:
+                if stage.exitcode not in (None, 0):
+                    raise RuntimeError(
+                        "Pipeline stage %s exited with code %d" % \
+                        (stage.name, stage.exitcode))
+
+
+class BarMirror(object):
+    """
+    Копия рыночных данных, которая заполняется барами, полученными от другого процесса конвейера. Предоставляет стратегии и портфолио тот же интерфейс, что и DataHandler.
+    """
+
+    def __init__(self, symbol_list):
+        """
+        Инициализирует пустую историю баров для всех тикеров.
+
+        Параметры:
+        symbol_list - Список тикеров.
+        """
+        self.symbol_list = symbol_list
+        self.latest_symbol_data = dict((s, []) for s in symbol_list)
+        self.continue_backtest = True
+
+    def append_bars(self, symbol, bars):
+        """
+        Добавляет новые бары тикера в историю.
+
+        Параметры:
+        symbol - Тикер.
+        bars - Список новых баров.
+        """
+        self.latest_symbol_data[symbol].extend(bars)
+
+    def get_latest_bars(self, symbol, N=1):
+        """
+        Возвращает последние N баров из истории тикера.
+        """
+        try:
+            bars_list = self.latest_symbol_data[symbol]
+        except KeyError:
+            print("That symbol is not available in the historical data set.")
+        else:
+            return bars_list[-N:]
+
+
+def _send_error(buffer):
+    """
+    Отправляет текст текущего исключения следующему этапу конвейера.
+    """
+    message = traceback.format_exc()[-buffer.slot_size // 2:]
+    buffer.put(('ERROR', message))
+
+
+def _new_bars(bars, symbol, sent):
+    """
+    Возвращает бары тикера, добавленные после предыдущей отправки, и новое состояние отправки.
+
+    Состояние отправки — пара (временная метка последнего отправленного бара, число отправленных баров с этой меткой), поэтому бары с одинаковой временной меткой не теряются.
+
+    Параметры:
+    bars - Объект DataHandler.
+    symbol - Тикер.
+    sent - Состояние отправки (None, если бары еще не отправлялись).
+    """
+    n = 1
+    window = bars.get_latest_bars(symbol, N=n) or []
+    if not window:
+        return [], sent
+    if sent is not None and window[-1][1] < sent[0]:
+        raise ValueError(
+            "Bar %s for %s is earlier than already sent bar %s" % \
+            (window[-1][1], symbol, sent[0]))
+
+    # Окно увеличивается, пока в него не попадут все бары с временной меткой
+    # последнего отправленного бара или вся история тикера.
+    while len(window) == n and (sent is None or window[0][1] >= sent[0]):
+        n *= 2
+        window = bars.get_latest_bars(symbol, N=n) or []
+
+    start = 0
+    if sent is not None:
+        last_time, same_time = sent
+        while start < len(window) and window[start][1] < last_time:
+            start += 1
+        start += same_time
+
+    new_bars = window[start:]
+    if not new_bars:
+        return [], sent
+    last_time = new_bars[-1][1]
+    return new_bars, (last_time, sum(1 for b in window if b[1] == last_time))
+
+
+def _data_stage(bar_buffer, data_handler_cls, csv_dir, symbol_list):
+    """
+    Этап конвейера, который читает и декодирует бары и передает их стадии стратегии вместе с событиями DataHandler.
+
+    Параметры:
+    bar_buffer - Кольцевой буфер для отправки баров.
+    data_handler_cls - (Класс) Обработчик рыночных данных.
+    csv_dir - Путь к каталогу с CSV-файлами данных.
+    symbol_list - Список тикеров.
+    """
+    try:
+        events = Queue.Queue()
+        bars = data_handler_cls(events, csv_dir, symbol_list)
+        sent = dict((s, None) for s in symbol_list)
+        while bars.continue_backtest:
+            bars.update_bars()
+
+            for s in symbol_list:
+                new_bars, sent[s] = _new_bars(bars, s, sent[s])
+                if new_bars:
+                    bar_buffer.put(('BARS', (s, new_bars)))
+
+            while not events.empty():
+                event = events.get(False)
+                if event is None:
+                    continue
+                if event.type == 'MARKET':
+                    bar_buffer.put(('MARKET', event))
+                else:
+                    bar_buffer.put(('EVENT', event))
+            bar_buffer.put(('END', None))
+        bar_buffer.put(('DONE', None))
+    except Exception:
+        _send_error(bar_buffer)
+
+
+def _strategy_stage(bar_buffer, signal_buffer, strategy_cls, symbol_list):
+    """
+    Этап конвейера, который вычисляет сигналы стратегии для каждого события MARKET и передает их вместе с барами стадии портфолио.
+
+    Параметры:
+    bar_buffer - Кольцевой буфер для получения баров.
+    signal_buffer - Кольцевой буфер для отправки баров и событий стратегии.
+    strategy_cls - (Класс) Стратегия.
+    symbol_list - Список тикеров.
+    """
+    try:
+        events = Queue.Queue()
+        bars = BarMirror(symbol_list)
+        strategy = strategy_cls(bars, events)
+        while True:
+            kind, payload = bar_buffer.get()
+            signal_buffer.put((kind, payload))
+            if kind in ('DONE', 'ERROR'):
+                break
+
+            if kind == 'BARS':
+                symbol, new_bars = payload
+                bars.append_bars(symbol, new_bars)
+            elif kind == 'MARKET':
+                strategy.calculate_signals(payload)
+                while not events.empty():
+                    event = events.get(False)
+                    if event is not None:
+                        signal_buffer.put(('STRATEGY', event))
+    except Exception:
+        _send_error(signal_buffer)
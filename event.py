@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 # event.py
 
 class Event(object):
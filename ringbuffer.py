@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# ringbuffer.py
+
+import multiprocessing
+import pickle
+import Queue
+
+
+class RingBuffer(object):
+    """
+    Кольцевой буфер в разделяемой памяти для передачи объектов между двумя процессами (один писатель, один читатель).
+
+    Каждый объект сериализуется через pickle и копируется в слот фиксированного размера. Порядок чтения совпадает с порядком записи.
+    """
+
+    def __init__(self, slots=256, slot_size=16384):
+        """
+        Инициализирует буфер, выделяет разделяемую память и семафоры свободных и занятых слотов.
+
+        Параметры:
+        slots - Количество слотов в буфере.
+        slot_size - Максимальный размер сериализованного объекта в байтах.
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+
+        self._data = multiprocessing.RawArray('c', slots * slot_size)
+        self._sizes = multiprocessing.RawArray('i', slots)
+        self._head = multiprocessing.RawValue('i', 0)
+        self._tail = multiprocessing.RawValue('i', 0)
+        self._free = multiprocessing.Semaphore(slots)
+        self._used = multiprocessing.Semaphore(0)
+
+    def put(self, obj, timeout=None):
+        """
+        Записывает объект в следующий свободный слот, ожидая освобождения слота при заполненном буфере.
+
+        Параметры:
+        obj - Объект для передачи.
+        timeout - Время ожидания свободного слота в секундах (None — ждать без ограничения).
+        """
+        payload = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        size = len(payload)
+        if size > self.slot_size:
+            raise ValueError(
+                "Object of %d bytes does not fit into slot of %d bytes" % \
+                (size, self.slot_size))
+
+        if not self._free.acquire(True, timeout):
+            raise Queue.Full
+
+        i = self._head.value
+        start = i * self.slot_size
+        self._data[start:start + size] = payload
+        self._sizes[i] = size
+        self._head.value = (i + 1) % self.slots
+        self._used.release()
+
+    def get(self, timeout=None):
+        """
+        Читает объект из самого старого занятого слота, ожидая записи при пустом буфере.
+
+        Параметры:
+        timeout - Время ожидания объекта в секундах (None — ждать без ограничения).
+        """
+        if not self._used.acquire(True, timeout):
+            raise Queue.Empty
+
+        i = self._tail.value
+        start = i * self.slot_size
+        payload = self._data[start:start + self._sizes[i]]
+        self._tail.value = (i + 1) % self.slots
+        self._free.release()
+        return pickle.loads(payload)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# test_backtest.py
+
+import unittest
+
+from backtest import Backtest
+from event import FillEvent, MarketEvent, OrderEvent, SignalEvent
+
+
+SYMBOLS = ['AAA', 'BB', 'C']
+
+
+class StubDataHandler(object):
+    """
+    Отдает по одному бару на тикер за вызов update_bars() и хранит историю, как HistoricCSVDataHandler.
+    """
+
+    bar_count = 60
+    bars_per_update = 1
+
+    def __init__(self, events, csv_dir, symbol_list):
+        self.events = events
+        self.symbol_list = symbol_list
+        self.data = dict((s, [self.make_bar(s, i)
+                              for i in range(self.bar_count)])
+                         for s in symbol_list)
+        self.latest_symbol_data = dict((s, []) for s in symbol_list)
+        self.index = 0
+        self.continue_backtest = True
+
+    def make_bar(self, symbol, i):
+        close = 100.0 + (i * 7 + len(symbol)) % 13
+        return (symbol, i, close, close, close, close, 1000)
+
+    def get_latest_bars(self, symbol, N=1):
+        return self.latest_symbol_data[symbol][-N:]
+
+    def update_bars(self):
+        for _ in range(self.bars_per_update):
+            for s in self.symbol_list:
+                if self.index >= len(self.data[s]):
+                    self.continue_backtest = False
+                else:
+                    self.latest_symbol_data[s].append(self.data[s][self.index])
+            self.index += 1
+        self.events.put(MarketEvent())
+
+
+class CopyingDataHandler(StubDataHandler):
+    """
+    Возвращает копии баров вместо хранимых объектов.
+    """
+
+    def get_latest_bars(self, symbol, N=1):
+        return [tuple(list(b)) for b in self.latest_symbol_data[symbol][-N:]]
+
+
+class MultiBarDataHandler(StubDataHandler):
+    bars_per_update = 3
+
+
+class DuplicateTimeDataHandler(StubDataHandler):
+    def make_bar(self, symbol, i):
+        close = 100.0 + (i * 7 + len(symbol)) % 13
+        return (symbol, i // 2, close, close, close, close, 1000)
+
+
+class DoubleMarketDataHandler(StubDataHandler):
+    """
+    Помещает в очередь два события MARKET за один вызов update_bars().
+    """
+
+    def update_bars(self):
+        StubDataHandler.update_bars(self)
+        self.events.put(MarketEvent())
+
+
+class ShortDataHandler(StubDataHandler):
+    bar_count = 8
+
+
+class BackwardsDataHandler(StubDataHandler):
+    def make_bar(self, symbol, i):
+        close = 100.0
+        return (symbol, i if i < 10 else i - 5, close, close, close, close, 1000)
+
+
+class LargeBarDataHandler(StubDataHandler):
+    def make_bar(self, symbol, i):
+        return (symbol, i, 1.0, 1.0, 1.0, 1.0, 'x' * 4096)
+
+
+class StubStrategy(object):
+    def __init__(self, bars, events):
+        self.bars = bars
+        self.events = events
+
+    def calculate_signals(self, event):
+        for s in self.bars.symbol_list:
+            bars = self.bars.get_latest_bars(s, N=5)
+            if len(bars) == 5:
+                mean = sum(b[5] for b in bars) / 5.0
+                signal_type = 'LONG' if bars[-1][5] > mean else 'EXIT'
+                self.events.put(SignalEvent(s, bars[-1][1], signal_type))
+
+
+class OrderingStrategy(StubStrategy):
+    """
+    Помимо сигналов помещает в очередь приказы напрямую.
+    """
+
+    def calculate_signals(self, event):
+        StubStrategy.calculate_signals(self, event)
+        for s in self.bars.symbol_list:
+            bars = self.bars.get_latest_bars(s, N=1)
+            if bars and bars[-1][1] % 7 == 0:
+                self.events.put(OrderEvent(s, 'MKT', 10, 'BUY'))
+
+
+class FailingStrategy(StubStrategy):
+    def calculate_signals(self, event):
+        raise ValueError("strategy failed")
+
+
+class StubPortfolio(object):
+    def __init__(self, bars, events, start_date, initial_capital):
+        self.bars = bars
+        self.events = events
+        self.positions = dict((s, 0) for s in bars.symbol_list)
+        self.cash = initial_capital
+        self.log = []
+
+    def update_timeindex(self, event):
+        history = dict((s, self.bars.get_latest_bars(s, N=1000))
+                       for s in self.bars.symbol_list)
+        self.log.append((history, dict(self.positions), self.cash))
+
+    def update_signal(self, event):
+        quantity = self.positions[event.symbol]
+        if event.signal_type == 'LONG' and quantity == 0:
+            self.events.put(OrderEvent(event.symbol, 'MKT', 100, 'BUY'))
+        if event.signal_type == 'EXIT' and quantity > 0:
+            self.events.put(OrderEvent(event.symbol, 'MKT', quantity, 'SELL'))
+
+    def update_fill(self, event):
+        fill_dir = 1 if event.direction == 'BUY' else -1
+        price = self.bars.get_latest_bars(event.symbol)[0][5]
+        self.positions[event.symbol] += fill_dir * event.quantity
+        self.cash -= fill_dir * event.quantity * price + event.commission
+
+
+class StubExecutionHandler(object):
+    def __init__(self, events):
+        self.events = events
+
+    def execute_order(self, event):
+        self.events.put(FillEvent(None, event.symbol, 'ARCA', event.quantity,
+                                  event.direction, 50.0))
+
+
+def run_backtest(data_handler, pipelined, strategy=StubStrategy,
+                 symbol_list=SYMBOLS, **kwargs):
+    backtest = Backtest('', symbol_list, 100000.0, None, data_handler,
+                        StubExecutionHandler, StubPortfolio, strategy,
+                        pipelined=pipelined, **kwargs)
+    backtest.run()
+    return backtest
+
+
+class PipelinedBacktestTest(unittest.TestCase):
+
+    def assert_modes_match(self, data_handler, **kwargs):
+        serial = run_backtest(data_handler, False, **kwargs)
+        pipelined = run_backtest(data_handler, True, **kwargs)
+
+        self.assertTrue(serial.signals > 0)
+        self.assertTrue(serial.fills > 0)
+        self.assertEqual(pipelined.portfolio.log, serial.portfolio.log)
+        self.assertEqual(pipelined.portfolio.positions,
+                         serial.portfolio.positions)
+        self.assertEqual(pipelined.portfolio.cash, serial.portfolio.cash)
+        self.assertEqual(
+            (pipelined.signals, pipelined.orders, pipelined.fills),
+            (serial.signals, serial.orders, serial.fills))
+        return serial, pipelined
+
+    def test_matches_serial_until_data_is_exhausted(self):
+        serial, pipelined = self.assert_modes_match(StubDataHandler)
+        # Последний вызов update_bars() не добавляет баров.
+        history = pipelined.data_handler.latest_symbol_data['AAA']
+        self.assertEqual([b[1] for b in history],
+                         list(range(StubDataHandler.bar_count)))
+
+    def test_matches_serial_with_copied_bars(self):
+        self.assert_modes_match(CopyingDataHandler)
+
+    def test_matches_serial_with_several_bars_per_update(self):
+        self.assert_modes_match(MultiBarDataHandler)
+
+    def test_matches_serial_with_duplicate_timestamps(self):
+        serial, pipelined = self.assert_modes_match(DuplicateTimeDataHandler)
+        history = pipelined.data_handler.latest_symbol_data['AAA']
+        self.assertEqual(len(history), DuplicateTimeDataHandler.bar_count)
+
+    def test_matches_serial_with_several_market_events_per_update(self):
+        self.assert_modes_match(DoubleMarketDataHandler)
+
+    def test_matches_serial_with_non_signal_strategy_events(self):
+        self.assert_modes_match(StubDataHandler, strategy=OrderingStrategy)
+
+    def test_matches_serial_with_universe_larger_than_slot(self):
+        symbol_list = ['SYM%03d' % i for i in range(300)]
+        self.assert_modes_match(ShortDataHandler, symbol_list=symbol_list)
+
+    def test_strategy_is_none_in_pipelined_mode(self):
+        self.assertTrue(run_backtest(StubDataHandler, True).strategy is None)
+
+    def test_stage_exception_is_raised(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            run_backtest(StubDataHandler, True, strategy=FailingStrategy)
+        self.assertTrue('strategy failed' in str(ctx.exception))
+
+    def test_bar_earlier_than_sent_bar_is_raised(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            run_backtest(BackwardsDataHandler, True)
+        self.assertTrue('is earlier than already sent bar' in str(ctx.exception))
+
+    def test_bar_larger_than_slot_is_raised(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            run_backtest(LargeBarDataHandler, True, buffer_slot_size=1024)
+        self.assertTrue('does not fit into slot' in str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# test_ringbuffer.py
+
+import multiprocessing
+import unittest
+import Queue
+
+from ringbuffer import RingBuffer
+
+
+def _produce(buffer, count):
+    for i in range(count):
+        buffer.put(('item', i))
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        buffer = RingBuffer(slots=4, slot_size=256)
+        buffer.put({'symbol': 'GOOG', 'close': 101.5})
+        self.assertEqual(buffer.get(timeout=1), {'symbol': 'GOOG', 'close': 101.5})
+
+    def test_wrap_around_preserves_order(self):
+        buffer = RingBuffer(slots=3, slot_size=256)
+        received = []
+        for i in range(10):
+            buffer.put(i)
+            if i % 2:
+                received.append(buffer.get(timeout=1))
+                received.append(buffer.get(timeout=1))
+        self.assertEqual(received, list(range(10)))
+
+    def test_get_times_out_when_empty(self):
+        buffer = RingBuffer(slots=2, slot_size=256)
+        self.assertRaises(Queue.Empty, buffer.get, timeout=0.05)
+
+    def test_put_times_out_when_full(self):
+        buffer = RingBuffer(slots=2, slot_size=256)
+        buffer.put(1)
+        buffer.put(2)
+        self.assertRaises(Queue.Full, buffer.put, 3, timeout=0.05)
+        self.assertEqual(buffer.get(timeout=1), 1)
+        buffer.put(3, timeout=0.05)
+        self.assertEqual(buffer.get(timeout=1), 2)
+        self.assertEqual(buffer.get(timeout=1), 3)
+
+    def test_object_larger_than_slot_is_rejected(self):
+        buffer = RingBuffer(slots=2, slot_size=64)
+        self.assertRaises(ValueError, buffer.put, 'x' * 1000)
+        buffer.put('small')
+        self.assertEqual(buffer.get(timeout=1), 'small')
+
+    def test_between_processes(self):
+        buffer = RingBuffer(slots=4, slot_size=256)
+        producer = multiprocessing.Process(target=_produce, args=(buffer, 50))
+        producer.start()
+        received = [buffer.get(timeout=5) for _ in range(50)]
+        producer.join()
+        self.assertEqual(received, [('item', i) for i in range(50)])
+
+
+if __name__ == '__main__':
+    unittest.main()